@@ -1,49 +1,81 @@
 from __future__ import annotations
 from aiogram.exceptions import TelegramNetworkError, TelegramBadRequest
 import asyncio
-import html
-import uuid
-from collections import deque
-from datetime import datetime, timezone, timedelta, time
+import base64
+import functools
+import random
+from collections import OrderedDict, defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from urllib.parse import urljoin
-from aiogram.exceptions import TelegramNetworkError
 import re
+import time
 import aiohttp
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from aiogram import Bot, Dispatcher, Router, F
 from aiogram.client.default import DefaultBotProperties
 from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
 from aiogram.enums import ParseMode
 from aiogram.filters import Command
-from aiogram.filters.callback_data import CallbackData
-from aiogram.types import CallbackQuery, Message
-from aiogram.utils.keyboard import InlineKeyboardBuilder
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
 
+from .browser_pool import close_browser
+from .cache import AsyncTTLCache
 from .config import Config
-from .formatter import format_result_messages, format_ai_answer_messages
-from .openrouter import openrouter_generate
+from .formatter import esc, format_result_messages, format_ai_answer_messages, pack_parts
+from .http_fetch import create_laborx_session
+from .openrouter import openrouter_close, openrouter_generate
 from .openrouter import openrouter_get_free_daily_limit, openrouter_get_key
 from .parser import JobData, parser_loop
 from .proposal_prompt import build_filled_prompt
+from .ratelimit import RateLimiter
 from .state import RuntimeState
 
+
 router = Router()
 
-JOB_URL_RE = re.compile(r"https?://(?:www\.)?laborx\.com/jobs/[^\s<>()]+", re.IGNORECASE)
-JOBS_LIST_URL_RE = re.compile(r"^https?://(?:www\.)?laborx\.com/jobs/?(?:\?.*)?$", re.IGNORECASE)
+JOB_URL_RE = re.compile(r"https?://(?:www\.)?laborx\.com/jobs/[^\s<>()]+", re.IGNORECASE | re.ASCII)
+_JOB_URL_SEARCH = JOB_URL_RE.search
+_URL_TRAILING = ").,;]}>\n\r\t"
+JOBS_LIST_URL_RE = re.compile(r"^https?://(?:www\.)?laborx\.com/jobs/?(?:\?.*)?$", re.IGNORECASE | re.ASCII)
+_JOBS_LIST_URL_MATCH = JOBS_LIST_URL_RE.match
 
 PAGE_NOT_FOUND_RE = re.compile(
     r'class="page-title"[^>]*>.*?class="primary"[^>]*>\s*404\s*<.*?Sorry,\s*page\s*not\s*found\.',
     re.IGNORECASE | re.DOTALL
 )
-
-
-async def retry_bool(fn, *args, attempts: int = 5, base_delay: float = 2.0, **kwargs) -> bool:
+_PAGE_NOT_FOUND_SEARCH = PAGE_NOT_FOUND_RE.search
+_NOT_FOUND_PROBES = (b'class="page-title"', b"404")
+_NOT_FOUND_PROBE_BYTES = 128 * 1024
+
+
+async def retry_bool(
+        fn,
+        *args,
+        attempts: int = 5,
+        base_delay: float = 2.0,
+        max_total_seconds: float = 15.0,
+        **kwargs,
+) -> bool:
+    started = time.monotonic()
     for i in range(attempts):
         ok = await fn(*args, **kwargs)
         if ok:
             return True
-        await asyncio.sleep(min(base_delay * (2 ** i), 20))
+        if i == attempts - 1:
+            break
+        # Разброс задержки не даёт параллельным обработчикам повторять запросы синхронно
+        delay = random.uniform(0.5, 1.0) * min(base_delay * (2 ** i), 20)
+        if time.monotonic() - started + delay > max_total_seconds:
+            break
+        await asyncio.sleep(delay)
     return False
 
 
@@ -63,6 +95,23 @@ async def safe_send(bot: Bot, chat_id: int, text: str, **kwargs) -> bool:
         return False
 
 
+class RateLimitMiddleware(BaseRequestMiddleware):
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None:
+            if method.__api_method__.startswith("send"):
+                # Отрицательные id — группы и каналы, для них действует окно 20/мин
+                group = isinstance(chat_id, str) or chat_id < 0
+                await self.limiter.acquire(chat_id, group=group)
+            else:
+                # Правки (edit*) и прочие вызовы не тратят поканальный бюджет, только общий
+                await self.limiter.acquire()
+        return await make_request(bot, method)
+
+
 _CB_TOO_OLD_MARKERS = (
     "query is too old",
     "response timeout expired",
@@ -96,62 +145,110 @@ async def safe_edit_text(msg: Message, text: str, **kwargs) -> bool:
         return False
 
 
+async def safe_edit_reply_markup(msg: Message, markup: InlineKeyboardMarkup | None = None) -> bool:
+    try:
+        await msg.edit_reply_markup(reply_markup=markup)
+        return True
+    except TelegramBadRequest as e:
+        if "message is not modified" in str(e).lower():
+            return True
+        return False
+    except TelegramNetworkError:
+        return False
+
+
 def _extract_job_url(text: str) -> str | None:
     if not text:
         return None
-    m = JOB_URL_RE.search(text)
+    m = _JOB_URL_SEARCH(text)
     if not m:
         return None
-    return m.group(0).rstrip(").,;]}>\n\r\t")
+    return m.group(0).rstrip(_URL_TRAILING)
 
 
-async def _ensure_http_session(app: "App") -> aiohttp.ClientSession:
-    if getattr(app, "http", None) is None or app.http.closed:
-        timeout = aiohttp.ClientTimeout(total=10)
-        headers = {
-            "User-Agent": (
-                "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
-                "(KHTML, like Gecko) Chrome/123.0 Safari/537.36"
-            )
-        }
-        app.http = aiohttp.ClientSession(timeout=timeout, headers=headers)
-    return app.http
+def _job_is_gone(resp: aiohttp.ClientResponse) -> bool:
+    if resp.status in (404, 410):
+        return True
+    return bool(resp.history) and _JOBS_LIST_URL_MATCH(str(resp.url)) is not None
+
+
+def _is_html(resp: aiohttp.ClientResponse) -> bool:
+    content_type = (resp.headers.get("Content-Type") or "").lower()
+    return "text/html" in content_type or content_type == ""
+
+
+async def _read_prefix(resp: aiohttp.ClientResponse, limit: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < limit:
+        chunk = await resp.content.read(limit - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return bytes(buf)
+
+
+_PAGE_EXISTS_TTL = 45.0
+_PAGE_EXISTS_LIMIT = 256
 
 
 async def _job_page_exists(app: "App", job_url: str) -> bool:
-    try:
-        session = await _ensure_http_session(app)
-        async with session.get(job_url, allow_redirects=True) as resp:
-            if resp.status in (404, 410):
-                return False
+    cache = app._page_exists_cache
+    now = time.monotonic()
+    while cache:
+        oldest_url, (ts, _) = next(iter(cache.items()))
+        if now - ts < _PAGE_EXISTS_TTL and len(cache) <= _PAGE_EXISTS_LIMIT:
+            break
+        del cache[oldest_url]
+
+    hit = cache.get(job_url)
+    if hit is not None:
+        return hit[1]
+
+    exists = await _fetch_job_page_exists(app, job_url)
+    if exists is None:
+        # Сетевую ошибку не кэшируем, чтобы следующий клик проверил страницу заново
+        return True
+    cache[job_url] = (now, exists)
+    return exists
 
-            final_url = str(resp.url)
 
-            if resp.history and JOBS_LIST_URL_RE.match(final_url):
+async def _fetch_job_page_exists(app: "App", job_url: str) -> bool | None:
+    try:
+        # Один GET даёт и статус, и редиректы; LaborX может отдать 200 с шаблоном 404 — читаем только начало
+        headers = {"Range": f"bytes=0-{_NOT_FOUND_PROBE_BYTES - 1}"}
+        async with app.http.get(job_url, allow_redirects=True, headers=headers) as resp:
+            if _job_is_gone(resp):
                 return False
 
-            content_type = (resp.headers.get("Content-Type") or "").lower()
-            if "text/html" in content_type or content_type == "":
-                page_html = await resp.text(errors="ignore")
-                if PAGE_NOT_FOUND_RE.search(page_html):
+            if _is_html(resp):
+                raw = await _read_prefix(resp, _NOT_FOUND_PROBE_BYTES)
+                # Дешёвая проверка по байтам; регулярка нужна только для редких страниц-кандидатов
+                if not all(probe in raw for probe in _NOT_FOUND_PROBES):
+                    return True
+                page_html = raw.decode(resp.get_encoding(), errors="ignore")
+                if _PAGE_NOT_FOUND_SEARCH(page_html):
                     return False
 
             return True
     except Exception:
-        return True
+        return None
 
 
-class JobActionCb(CallbackData, prefix="job"):
-    act: str
-    jid: str
+_KB_ACCEPT_TEXT = "✅ Accept"
+_KB_SKIP_TEXT = "❌ Skip"
+_CB_ACCEPT = "j:a:"
+_CB_SKIP = "j:s:"
 
 
-def job_actions_kb(jid: str):
-    kb = InlineKeyboardBuilder()
-    kb.button(text="✅ Accept", callback_data=JobActionCb(act="accept", jid=jid).pack())
-    kb.button(text="❌ Skip", callback_data=JobActionCb(act="skip", jid=jid).pack())
-    kb.adjust(2)
-    return kb.as_markup()
+def job_actions_kb(jid: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(text=_KB_ACCEPT_TEXT, callback_data=f"{_CB_ACCEPT}{jid}"),
+                InlineKeyboardButton(text=_KB_SKIP_TEXT, callback_data=f"{_CB_SKIP}{jid}"),
+            ]
+        ]
+    )
 
 
 def fmt_reset_ms(ms: int | None) -> str:
@@ -165,22 +262,60 @@ def fmt_bool(v: bool) -> str:
     return "✅ Yes" if v else "❌ No"
 
 
-def next_utc_midnight_local_str() -> str:
-    now = datetime.now(timezone.utc)
-    next_midnight_utc = datetime.combine(now.date() + timedelta(days=1), time(0, 0), tzinfo=timezone.utc)
+@functools.lru_cache(maxsize=1)
+def _utc_midnight_local_str(epoch_day: int) -> str:
+    next_midnight_utc = datetime.fromtimestamp((epoch_day + 1) * 86400, tz=timezone.utc)
     return next_midnight_utc.astimezone().strftime("%Y-%m-%d %H:%M")
 
 
+def next_utc_midnight_local_str() -> str:
+    return _utc_midnight_local_str(_utc_epoch_day())
+
+
+_STATUS_TMPL = "\n".join(
+    [
+        "<b>LaborX Parser Status</b>",
+        "",
+        "<b>Parser</b>",
+        "<blockquote>"
+        "Running: {running}\n"
+        "Sent: <code>{sent_count}</code>\n"
+        "Last top href: {last_href}"
+        "</blockquote>",
+        "",
+        "<b>Cache</b>",
+        "<blockquote>"
+        "Seen cache: <code>{seen_count}/{seen_limit}</code>\n"
+        "Cached jobs: <code>{jobs_count}/{jobs_limit}</code>"
+        "</blockquote>",
+        "",
+        "<b>OpenRouter</b>",
+        "<blockquote>"
+        "{ai_line}\n"
+        "Free daily reset: <code>00:00 UTC (next {free_reset_local} local)</code>\n"
+        "Key limit reset (spend limit): <code>{key_limit_reset}</code>\n"
+        "Free tier: {free_tier}"
+        "</blockquote>",
+        "",
+        "<b>Errors</b>",
+        "<blockquote>"
+        "Last error: <code>{last_error}</code>\n"
+        "OpenRouter status error: <code>{status_err}</code>"
+        "</blockquote>",
+    ]
+)
+
+
 def status_html(app: App, cfg: Config, *, daily_limit, key_info, err) -> str:
     running = app.is_running()
 
     last_href = "—"
     if app.state.last_seen_href:
         last_href = urljoin("https://laborx.com", app.state.last_seen_href)
-    last_href = f"<code>{html.escape(last_href)}</code>" if last_href != "—" else "—"
+    last_href = f"<code>{esc(last_href)}</code>" if last_href != "—" else "—"
 
-    last_error = html.escape(app.state.last_error or "—")
-    status_err = html.escape(err or "—")
+    last_error = esc(app.state.last_error or "—")
+    status_err = esc(err or "—")
 
     free_reset_local = next_utc_midnight_local_str()
 
@@ -190,7 +325,7 @@ def status_html(app: App, cfg: Config, *, daily_limit, key_info, err) -> str:
         d = key_info.get("data") or {}
         free_tier = "✅ True" if d.get("is_free_tier") is True else (
             "❌ False" if d.get("is_free_tier") is False else "—")
-        limit_reset = html.escape(str(d.get("limit_reset") or "—"))
+        limit_reset = esc(str(d.get("limit_reset") or "—"))
 
     key_limit_reset = limit_reset
 
@@ -203,140 +338,250 @@ def status_html(app: App, cfg: Config, *, daily_limit, key_info, err) -> str:
     else:
         ai_line = "Free remaining today: <code>—</code>\nUsed today (bot): <code>—</code>"
 
-    return "\n".join(
-        [
-            "<b>LaborX Parser Status</b>",
-            "",
-            "<b>Parser</b>",
-            "<blockquote>"
-            f"Running: {fmt_bool(running)}\n"
-            f"Sent: <code>{app.state.sent_count}</code>\n"
-            f"Last top href: {last_href}"
-            "</blockquote>",
-            "",
-            "<b>Cache</b>",
-            "<blockquote>"
-            f"Seen cache: <code>{len(app.state.seen_set)}/{cfg.seen_limit}</code>\n"
-            f"Cached jobs: <code>{len(app.jobs)}/{app.jobs_limit}</code>"
-            "</blockquote>",
-            "",
-            "<b>OpenRouter</b>",
-            "<blockquote>"
-            f"{ai_line}\n"
-            f"Free daily reset: <code>00:00 UTC (next {free_reset_local} local)</code>\n"
-            f"Key limit reset (spend limit): <code>{key_limit_reset}</code>\n"
-            f"Free tier: {free_tier}"
-            "</blockquote>",
-            "",
-            "<b>Errors</b>",
-            "<blockquote>"
-            f"Last error: <code>{last_error}</code>\n"
-            f"OpenRouter status error: <code>{status_err}</code>"
-            "</blockquote>",
-        ]
+    return _STATUS_TMPL.format_map(
+        {
+            "running": fmt_bool(running),
+            "sent_count": app.state.sent_count,
+            "last_href": last_href,
+            "seen_count": len(app.state.seen),
+            "seen_limit": cfg.seen_limit,
+            "jobs_count": len(app.jobs),
+            "jobs_limit": app.jobs_limit,
+            "ai_line": ai_line,
+            "free_reset_local": free_reset_local,
+            "key_limit_reset": key_limit_reset,
+            "free_tier": free_tier,
+            "last_error": last_error,
+            "status_err": status_err,
+        }
     )
 
 
-def _ensure_ai_day(state):
-    today_utc = datetime.now(timezone.utc).date()
-    if state.ai_utc_day != today_utc:
-        state.ai_utc_day = today_utc
-        state.ai_used_today = 0
+def _utc_epoch_day() -> int:
+    return int(time.time()) // 86400
+
+
+async def _ai_day_reset_loop(state) -> None:
+    state.ai_utc_day = _utc_epoch_day()
+    while True:
+        await asyncio.sleep(max(0.0, (state.ai_utc_day + 1) * 86400 - time.time()))
+        today = _utc_epoch_day()
+        if today != state.ai_utc_day:
+            state.ai_utc_day = today
+            state.ai_used_today = 0
+
+
+@dataclass
+class JobEntry:
+    job: JobData
+    html: str
+    markup: InlineKeyboardMarkup
+    status: str | None = None
 
 
 class App:
     def __init__(self, cfg: Config):
         self.cfg = cfg
         self.state = RuntimeState()
-        self.queue: asyncio.Queue[JobData] = asyncio.Queue()
+        # Вакансии уходят в порядке публикации, заполненная очередь притормаживает парсер на put()
+        self.queue: asyncio.Queue[JobData] = asyncio.Queue(maxsize=max(64, cfg.seen_limit // 4))
         self.stop_event = asyncio.Event()
         self.parser_task: asyncio.Task | None = None
         self.sender_task: asyncio.Task | None = None
-
-        self.http: aiohttp.ClientSession | None = None
-
-        self.jobs: dict[str, JobData] = {}
-        self.jobs_order: deque[str] = deque()
+        self._startup_pending = False
+        self.limiter = RateLimiter()
+        self._send_sem = asyncio.Semaphore(5)
+        self._chat_locks: defaultdict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._bg_tasks: set[asyncio.Task] = set()
+        self._cpu_sem = asyncio.Semaphore(4)
+        self._ai_sem = asyncio.Semaphore(cfg.ai_concurrency or 3)
+        self._err_windows: defaultdict[int, deque[float]] = defaultdict(deque)
+
+        self.http: aiohttp.ClientSession = create_laborx_session()
+
+        self.jobs: OrderedDict[str, JobEntry] = OrderedDict()
         self.jobs_limit: int = cfg.seen_limit
+        # Стартуем со времени запуска, чтобы id не пересекались с кнопками прошлого процесса
+        self._jid_ctr = int(time.time())
+        self._page_exists_cache: OrderedDict[str, tuple[float, bool]] = OrderedDict()
+
+        self._key_cache = AsyncTTLCache(45)
 
         self.generated_answers: dict[str, str] = {}
         self.processing: set[str] = set()
 
-    def _remember_job(self, job: JobData) -> str:
-        jid = uuid.uuid4().hex
-        self.jobs[jid] = job
-        self.jobs_order.append(jid)
-        while len(self.jobs_order) > self.jobs_limit:
-            old = self.jobs_order.popleft()
-            self.jobs.pop(old, None)
+    def _remember_job(self, job: JobData, html_text: str) -> str:
+        self._jid_ctr += 1
+        jid = base64.b32encode(self._jid_ctr.to_bytes(5, "big")).rstrip(b"=").decode()
+        self.jobs[jid] = JobEntry(job, html_text, job_actions_kb(jid))
+        if len(self.jobs) > self.jobs_limit:
+            self.jobs.popitem(last=False)
         return jid
 
     def _forget_job(self, jid: str) -> None:
         self.jobs.pop(jid, None)
 
-    async def sender_loop(self, bot: Bot):
-        while True:
-            job = await self.queue.get()
-            chat_id = self.state.target_chat_id
-            if not chat_id:
-                continue
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
+        return task
 
-            if self.state.startup_chat_id and self.state.startup_message_id:
-                try:
-                    await bot.edit_message_text(
-                        chat_id=self.state.startup_chat_id,
-                        message_id=self.state.startup_message_id,
-                        text="✅ Monitoring started. I’ll send new job listings here.",
-                        disable_web_page_preview=True,
-                    )
-                except Exception:
-                    pass
-                finally:
-                    self.state.startup_chat_id = None
-                    self.state.startup_message_id = None
+    async def _edit_startup_banner(self, bot: Bot, chat_id: int, message_id: int) -> None:
+        try:
+            await bot.edit_message_text(
+                chat_id=chat_id,
+                message_id=message_id,
+                text="✅ Monitoring started. I’ll send new job listings here.",
+                disable_web_page_preview=True,
+            )
+        except Exception:
+            pass
+
+    async def _notify_error(
+            self,
+            msg: Message,
+            status_text: str,
+            markup: InlineKeyboardMarkup,
+            e: Exception,
+    ) -> None:
+        # Во время сбоя OpenRouter не шлём отдельный ответ на каждую ошибку, чтобы не упереться в лимиты Telegram
+        window = self._err_windows[msg.chat.id]
+        now = time.monotonic()
+        while window and now - window[0] > 60:
+            window.popleft()
+        window.append(now)
+        flooding = len(window) > 5
+
+        marker = "❗ OpenRouter unavailable. Tap Accept to retry." if flooding else "❗ OpenRouter error. Tap Accept to retry."
+        await retry_bool(
+            safe_edit_text,
+            msg,
+            f"{status_text}\n{marker}",
+            attempts=3,
+            base_delay=2.0,
+            reply_markup=markup,
+            disable_web_page_preview=True,
+        )
+        if not flooding:
+            await safe_reply(msg, f"OpenRouter error: {e}")
+
+    async def _send_job(self, bot: Bot, job: JobData) -> None:
+        chat_id = self.state.target_chat_id
+        if not chat_id:
+            return
 
-            parts = format_result_messages(job)
-            jid = self._remember_job(job)
+        parts = pack_parts(format_result_messages(job))
+        jid = self._remember_job(job, parts[0])
+        markup = self.jobs[jid].markup
 
+        # Порядок частей держат этот цикл и лок чата; RateLimiter только задаёт темп и очередь не гарантирует
+        async with self._chat_locks[chat_id], self._send_sem:
             for i, text in enumerate(parts):
-                for i, text in enumerate(parts):
-                    is_first = i == 0
-
-                    sent = False
-                    for attempt in range(3):
-                        sent = await safe_send(
-                            bot,
-                            chat_id,
-                            text,
-                            reply_markup=job_actions_kb(jid) if is_first else None,
-                            disable_web_page_preview=True,
-                        )
-                        if sent:
-                            break
-                        await asyncio.sleep(5 * (attempt + 1))
+                is_first = i == 0
 
-                    if not sent:
-                        continue
+                sent = False
+                for attempt in range(3):
+                    sent = await safe_send(
+                        bot,
+                        chat_id,
+                        text,
+                        reply_markup=markup if is_first else None,
+                        disable_web_page_preview=True,
+                    )
+                    if sent:
+                        break
+                    await asyncio.sleep(5 * (attempt + 1))
+
+    async def sender_loop(self, bot: Bot):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < 16:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
 
-                    await asyncio.sleep(1.05)
+            if self._startup_pending:
+                self._startup_pending = False
+                sc, sm = self.state.startup_chat_id, self.state.startup_message_id
+                self.state.startup_chat_id = None
+                self.state.startup_message_id = None
+                if self.state.target_chat_id and sc and sm:
+                    self._spawn(self._edit_startup_banner(bot, sc, sm))
+
+            try:
+                await asyncio.gather(*(self._send_job(bot, j) for j in batch), return_exceptions=True)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
 
     def is_running(self) -> bool:
         return self.parser_task is not None and not self.parser_task.done()
 
+    async def drain(self, timeout: float) -> None:
+        # Парсер больше не кладёт в очередь, а уже найденные вакансии успевают уйти
+        self.stop_event.set()
+        if self.parser_task is not None and not self.parser_task.done():
+            # Браузер закрываем только после того, как парсер закрыл свой контекст
+            try:
+                await asyncio.wait_for(asyncio.shield(self.parser_task), timeout)
+            except asyncio.TimeoutError:
+                self.parser_task.cancel()
+                await asyncio.gather(self.parser_task, return_exceptions=True)
+            except Exception:
+                pass
+        if self.sender_task is None or self.sender_task.done():
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.sender_task.cancel()
+
+
+_STATUS_SUFFIXES = (
+    "❌ Skipped",
+    "✅ Accepted",
+    "😕 This job is no longer available.",
+)
+_STATUS_TAIL_LEN = 64
+
 
 def _append_status(html_text: str, status: str) -> str:
-    already = (
-        "❌ Skipped",
-        "✅ Accepted",
-        "😕 This job is no longer available.",
-    )
-    if any(html_text.rstrip().endswith(s) for s in already):
+    tail = html_text[-_STATUS_TAIL_LEN:]
+    if tail.rstrip().endswith(_STATUS_SUFFIXES):
         return html_text
     return f"{html_text}\n\n{status}"
 
 
+def _msg_html(msg: Message) -> str:
+    # Без entities разметки нет — достаточно экранировать текст, не обходя сущности
+    if not getattr(msg, "entities", None):
+        return esc(msg.text or "")
+    return msg.html_text or msg.text or ""
+
+
+def _mark_status(entry: JobEntry | None, html_text: str, status: str) -> str:
+    # Без записи в кэше нет ни флага, ни исходного текста, остаётся проверка по тексту сообщения
+    if entry is None:
+        return _append_status(html_text, status)
+    return f"{entry.html}\n\n{status}"
+
+
+_SHUTDOWN_GRACE = 10.0
+
+
+def _orjson_dumps(obj) -> str:
+    # aiogram ждёт от json_dumps строку, orjson отдаёт bytes
+    return orjson.dumps(obj).decode()
+
+
 def setup_bot(cfg: Config) -> tuple[Bot, Dispatcher, App]:
-    session = AiohttpSession(timeout=90)
+    if orjson is not None:
+        session = AiohttpSession(timeout=90, json_loads=orjson.loads, json_dumps=_orjson_dumps)
+    else:
+        session = AiohttpSession(timeout=90)
 
     bot = Bot(
         token=cfg.bot_token,
@@ -346,6 +591,23 @@ def setup_bot(cfg: Config) -> tuple[Bot, Dispatcher, App]:
 
     dp = Dispatcher()
     app = App(cfg)
+    bot.session.middleware(RateLimitMiddleware(app.limiter))
+
+    @dp.startup()
+    async def on_startup():
+        app._spawn(_ai_day_reset_loop(app.state))
+        # Отправитель ждёт на queue.get() с самого старта, /start только запускает парсер
+        if app.sender_task is None:
+            app.sender_task = asyncio.create_task(app.sender_loop(bot))
+
+    @dp.shutdown()
+    async def on_shutdown():
+        # Polling уже остановлен, сессия бота ещё открыта — дописываем очередь
+        await app.drain(_SHUTDOWN_GRACE)
+        await openrouter_close()
+        await close_browser()
+        if not app.http.closed:
+            await app.http.close()
 
     @router.message(Command("start"))
     async def cmd_start(message: Message):
@@ -357,21 +619,20 @@ def setup_bot(cfg: Config) -> tuple[Bot, Dispatcher, App]:
 
         app.state.last_seen_href = None
         app.state.max_seen_job_id = 0
-        app.state.seen_set.clear()
-        app.state.seen_order.clear()
+        app.state.seen.clear()
         app.jobs.clear()
-        app.jobs_order.clear()
         app.stop_event.clear()
         app.state.running = True
         app.state.last_error = None
 
-        if app.sender_task is None or app.sender_task.done():
+        if app.sender_task.done():
             app.sender_task = asyncio.create_task(app.sender_loop(bot))
 
         app.parser_task = asyncio.create_task(parser_loop(cfg, app.state, app.queue, app.stop_event))
         m = await message.answer("⏳ Starting… getting initial data from LaborX. Please wait…")
         app.state.startup_chat_id = m.chat.id
         app.state.startup_message_id = m.message_id
+        app._startup_pending = True
 
     @router.message(Command("stop"))
     async def cmd_stop(message: Message):
@@ -386,18 +647,13 @@ def setup_bot(cfg: Config) -> tuple[Bot, Dispatcher, App]:
     async def cmd_status(message: Message):
         progress = await message.answer("⏳ Getting status…")
 
-        today_utc = datetime.now(timezone.utc).date()
-        if app.state.ai_utc_day != today_utc:
-            app.state.ai_utc_day = today_utc
-            app.state.ai_used_today = 0
-
         daily_limit = None
         key_info = None
         err = None
 
         try:
             daily_limit = await openrouter_get_free_daily_limit(cfg)
-            key_info = await openrouter_get_key(cfg)
+            key_info = await app._key_cache.get(lambda: openrouter_get_key(cfg))
         except Exception as e:
             err = str(e)
 
@@ -406,53 +662,80 @@ def setup_bot(cfg: Config) -> tuple[Bot, Dispatcher, App]:
             disable_web_page_preview=True
         )
 
-    @router.callback_query(JobActionCb.filter(F.act == "skip"))
-    async def on_skip(query: CallbackQuery, callback_data: JobActionCb):
-        jid = callback_data.jid
+    @router.callback_query(F.data.startswith(_CB_SKIP))
+    async def on_skip(query: CallbackQuery):
+        jid = query.data[len(_CB_SKIP):]
 
         msg = query.message
         if not msg:
             await safe_answer(query, "No message")
             return
 
+        entry = app.jobs.get(jid)
+        if entry is not None and entry.status == "skip":
+            await safe_answer(query, "Already handled")
+            return
+        if entry is not None and entry.status == "accept":
+            # Пока идёт Accept, Skip забыл бы вакансию, а Accept потом перезаписал бы сообщение
+            await safe_answer(query, "Still working...")
+            return
+
         await safe_answer(query, "Skipping...")
 
-        html_text = getattr(msg, "html_text", None) or msg.text or ""
+        html_text = entry.html if entry is not None else _msg_html(msg)
+        prev_status = None
+        if entry is not None:
+            prev_status = entry.status
+            entry.status = "skip"
 
-        skipping_text = _append_status(html_text, "⏳ Skipping…")
+        skipping_text = _mark_status(entry, html_text, "⏳ Skipping…")
         ok = await retry_bool(
             safe_edit_text,
             msg,
             skipping_text,
             attempts=5,
             base_delay=1.5,
-            reply_markup=job_actions_kb(jid),
+            reply_markup=entry.markup if entry is not None else job_actions_kb(jid),
             disable_web_page_preview=True,
         )
         if not ok:
+            if entry is not None:
+                entry.status = prev_status
             await safe_answer(query, "Telegram network issue. Try again.", show_alert=True)
             return
 
-        final_text = _append_status(html_text, "❌ Skipped")
-        ok = await retry_bool(
-            safe_edit_text,
-            msg,
-            final_text,
-            attempts=5,
-            base_delay=1.5,
-            reply_markup=None,
-            disable_web_page_preview=True,
-        )
+        final_text = _mark_status(entry, html_text, "❌ Skipped")
+        if final_text is html_text:
+            # Статус уже стоит в тексте — снимаем только клавиатуру, текст не пересылаем
+            ok = await retry_bool(
+                safe_edit_reply_markup,
+                msg,
+                None,
+                attempts=5,
+                base_delay=1.5,
+            )
+        else:
+            ok = await retry_bool(
+                safe_edit_text,
+                msg,
+                final_text,
+                attempts=5,
+                base_delay=1.5,
+                reply_markup=None,
+                disable_web_page_preview=True,
+            )
         if not ok:
+            if entry is not None:
+                entry.status = prev_status
             await safe_answer(query, "Telegram network issue. Try again.", show_alert=True)
             return
 
         app.generated_answers.pop(jid, None)
         app._forget_job(jid)
 
-    @router.callback_query(JobActionCb.filter(F.act == "accept"))
-    async def on_accept(query: CallbackQuery, callback_data: JobActionCb):
-        jid = callback_data.jid
+    @router.callback_query(F.data.startswith(_CB_ACCEPT))
+    async def on_accept(query: CallbackQuery):
+        jid = query.data[len(_CB_ACCEPT):]
 
         if jid in app.processing:
             await safe_answer(query, "Still working...")
@@ -465,18 +748,23 @@ def setup_bot(cfg: Config) -> tuple[Bot, Dispatcher, App]:
                 await safe_answer(query, "No message")
                 return
 
-            await safe_answer(query, "Working...")
+            entry = app.jobs.get(jid)
+            if entry is not None and entry.status == "skip":
+                await safe_answer(query, "Already handled")
+                return
 
-            html_text = getattr(msg, "html_text", None) or msg.text or ""
-            job = app.jobs.get(jid)
+            await safe_answer(query, "Working...")
 
-            if job is None:
+            if entry is None:
                 await safe_answer(query, "Job data not found (cache expired)", show_alert=True)
                 return
+            entry.status = "accept"
+            job = entry.job
+            html_text = entry.html
 
             job_url = (job.url if job else None) or _extract_job_url(html_text)
             if job_url and not await _job_page_exists(app, job_url):
-                stale_text = _append_status(html_text, "😕 This job is no longer available.")
+                stale_text = _mark_status(entry, html_text, "😕 This job is no longer available.")
                 await retry_bool(
                     safe_edit_text,
                     msg,
@@ -490,62 +778,59 @@ def setup_bot(cfg: Config) -> tuple[Bot, Dispatcher, App]:
                 app._forget_job(jid)
                 return
 
-            accepted_text = _append_status(html_text, "✅ Accepted")
+            accepted_text = _mark_status(entry, html_text, "✅ Accepted")
 
-            await retry_bool(
+            # Правку с прогрессом не ждём: запрос к OpenRouter стартует сразу,
+            # а перед следующими правками сообщения дожидаемся её, чтобы не перезаписать их
+            progress = app._spawn(retry_bool(
                 safe_edit_text,
                 msg,
                 accepted_text + "\n⏳ Generating reply…",
                 attempts=5,
                 base_delay=1.5,
-                reply_markup=job_actions_kb(jid),
+                reply_markup=entry.markup,
                 disable_web_page_preview=True,
-            )
+            ))
 
             answer = app.generated_answers.get(jid)
 
             if answer is None:
-                prompt = build_filled_prompt(job, app.cfg.portfolio_url)
+                async with app._cpu_sem:
+                    prompt = await asyncio.to_thread(build_filled_prompt, job, app.cfg.portfolio_url)
                 try:
-                    answer = await asyncio.wait_for(
-                        openrouter_generate(
-                            prompt,
-                            app.cfg,
-                            state=app.state,
-                            reasoning_enabled=False,
-                            timeout_seconds=60,
-                            max_retries=1,
-                        ),
-                        timeout=80,
-                    )
+                    async with app._ai_sem:
+                        answer = await asyncio.wait_for(
+                            openrouter_generate(
+                                prompt,
+                                app.cfg,
+                                state=app.state,
+                                reasoning_enabled=False,
+                                timeout_seconds=60,
+                                max_retries=1,
+                            ),
+                            timeout=80,
+                        )
                 except asyncio.TimeoutError:
+                    await progress
                     await retry_bool(
                         safe_edit_text,
                         msg,
                         accepted_text + "\n⚠️ Generation timed out. Tap Accept to retry.",
                         attempts=3,
                         base_delay=2.0,
-                        reply_markup=job_actions_kb(jid),
+                        reply_markup=entry.markup,
                         disable_web_page_preview=True,
                     )
                     return
                 except Exception as e:
-                    await retry_bool(
-                        safe_edit_text,
-                        msg,
-                        accepted_text + "\n❗ OpenRouter error. Tap Accept to retry.",
-                        attempts=3,
-                        base_delay=2.0,
-                        reply_markup=job_actions_kb(jid),
-                        disable_web_page_preview=True,
-                    )
-                    await safe_reply(msg, f"OpenRouter error: {e}")
+                    await progress
+                    await app._notify_error(msg, accepted_text, entry.markup, e)
                     return
 
                 app.generated_answers[jid] = answer
 
             sent_all = True
-            for i, text in enumerate(format_ai_answer_messages(job, answer)):
+            for i, text in enumerate(pack_parts(format_ai_answer_messages(job, answer))):
                 if i == 0:
                     ok = await retry_bool(
                         safe_reply,
@@ -570,18 +855,22 @@ def setup_bot(cfg: Config) -> tuple[Bot, Dispatcher, App]:
                     sent_all = False
                     break
 
+                await asyncio.sleep(0)
+
             if not sent_all:
+                await progress
                 await retry_bool(
                     safe_edit_text,
                     msg,
                     accepted_text + "\n⚠️ Telegram send failed. Tap Accept again to retry.",
                     attempts=3,
                     base_delay=2.0,
-                    reply_markup=job_actions_kb(jid),
+                    reply_markup=entry.markup,
                     disable_web_page_preview=True,
                 )
                 return
 
+            await progress
             await retry_bool(
                 safe_edit_text,
                 msg,
@@ -597,6 +886,10 @@ def setup_bot(cfg: Config) -> tuple[Bot, Dispatcher, App]:
 
         finally:
             app.processing.discard(jid)
+            # После сбоя вакансия остаётся в кэше — снова разрешаем и Accept, и Skip
+            entry = app.jobs.get(jid)
+            if entry is not None and entry.status == "accept":
+                entry.status = None
 
     dp.include_router(router)
     return bot, dp, app
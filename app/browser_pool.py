@@ -0,0 +1,33 @@
+import asyncio
+
+from playwright.async_api import Browser, Playwright, async_playwright
+
+_playwright: Playwright | None = None
+_browser: Browser | None = None
+_lock = asyncio.Lock()
+
+
+async def get_browser(*, headless: bool = True) -> Browser:
+    global _playwright, _browser
+    async with _lock:
+        # Один Chromium на процесс: перезапуск парсера создаёт только новый контекст
+        if _browser is not None and _browser.is_connected():
+            return _browser
+        if _playwright is None:
+            _playwright = await async_playwright().start()
+        _browser = await _playwright.chromium.launch(headless=headless)
+        return _browser
+
+
+async def close_browser() -> None:
+    global _playwright, _browser
+    async with _lock:
+        if _browser is not None:
+            try:
+                await _browser.close()
+            except Exception:
+                pass
+            _browser = None
+        if _playwright is not None:
+            await _playwright.stop()
+            _playwright = None
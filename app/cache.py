@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+
+class AsyncTTLCache:
+    def __init__(self, ttl: float, *, stale_while_revalidate: bool = False):
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self._value = None
+        self._ts = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+
+    def invalidate(self) -> None:
+        self._value = None
+        self._ts = 0.0
+
+    async def get(self, fn):
+        if self._value is not None and time.monotonic() - self._ts < self.ttl:
+            return self._value
+
+        # Устаревшее значение отдаём сразу, а обновляем в фоне
+        if self.stale_while_revalidate and self._value is not None:
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self._refresh(fn))
+            return self._value
+
+        async with self._lock:
+            now = time.monotonic()
+            if self._value is not None and now - self._ts < self.ttl:
+                return self._value
+            try:
+                self._value = await fn()
+            except Exception:
+                self.invalidate()
+                raise
+            self._ts = now
+            return self._value
+
+    async def _refresh(self, fn) -> None:
+        async with self._lock:
+            try:
+                value = await fn()
+            except Exception:
+                # При сбое сети продолжаем отдавать последнее известное значение
+                return
+            self._value = value
+            self._ts = time.monotonic()
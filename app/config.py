@@ -13,24 +13,24 @@ class Config:
     max_list_items: int = 5
     seen_limit: int = 20
     headless: bool = True
-    user_data_dir: str = "laborx_profile"
+    ai_concurrency: int = 3
+    parse_concurrency: int = 3
+    http_fast_path: bool = True
+    max_rps: int = 4
+    offset_path: str = ".tg_offset"
 
 
-def load_config() -> Config:
-    token = os.environ.get("TG_BOT_TOKEN")
-    if not token:
-        raise RuntimeError("TG_BOT_TOKEN is not set in the environment.")
-
-    portfolio_url = os.environ.get("PORTFOLIO_URL")
-    if not portfolio_url:
-        raise RuntimeError("PORTFOLIO_URL is not set in the environment.")
+_REQUIRED = ("TG_BOT_TOKEN", "PORTFOLIO_URL", "OPENROUTER_API_KEY", "OPENROUTER_MODEL")
 
-    api_key = os.environ.get("OPENROUTER_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENROUTER_API_KEY is not set in the environment.")
-
-    model = os.environ.get("OPENROUTER_MODEL")
-    if not model:
-        raise RuntimeError("OPENROUTER_MODEL is not set in the environment.")
 
+def load_config() -> Config:
+    env = os.environ
+    values = []
+    for name in _REQUIRED:
+        value = env.get(name)
+        if not value:
+            raise RuntimeError(f"{name} is not set in the environment.")
+        values.append(value)
+
+    token, portfolio_url, api_key, model = values
     return Config(bot_token=token, portfolio_url=portfolio_url, openrouter_api_key=api_key, openrouter_model=model)
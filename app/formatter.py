@@ -1,8 +1,19 @@
-import html
+import re
 from typing import List
 
 TG_LIMIT = 3900
 
+_HTML_TT = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#x27;"})
+
+_NEEDS_ESCAPE = re.compile(r"[&<>\"']")
+
+
+def esc(s: str) -> str:
+    # Обычное описание без спецсимволов возвращаем как есть, без копии строки
+    if not s or _NEEDS_ESCAPE.search(s) is None:
+        return s
+    return s.translate(_HTML_TT)
+
 
 def format_tags_code_lines(tags: list[str]) -> str:
     if not tags:
@@ -12,19 +23,54 @@ def format_tags_code_lines(tags: list[str]) -> str:
     last = len(tags) - 1
     for i, t in enumerate(tags):
         suffix = "," if i != last else ""
-        lines.append(f"<code>{html.escape(t)}</code>{suffix}")
+        lines.append(f"<code>{esc(t)}</code>{suffix}")
     return "\n".join(lines)
 
 
+def _split_escaped(escaped: str, size: int) -> List[str]:
+    # Режем уже экранированный текст, не разрывая сущности вроде &amp;
+    chunks: List[str] = []
+    n = len(escaped)
+    i = 0
+    while i < n:
+        end = min(i + size, n)
+        if end < n:
+            amp = escaped.rfind("&", i, end)
+            if amp > i and escaped.find(";", amp, end) == -1:
+                end = amp
+        chunks.append(escaped[i:end])
+        i = end
+    return chunks
+
+
+def pack_parts(parts: List[str], limit: int = TG_LIMIT) -> List[str]:
+    # Запас до 4096 нужен под строки статуса, которые дописываются к первой части
+    packed: List[str] = []
+    current = ""
+    for part in parts:
+        if not current:
+            current = part
+            continue
+        candidate = f"{current}\n\n{part}"
+        if len(candidate) <= limit:
+            current = candidate
+        else:
+            packed.append(current)
+            current = part
+    if current:
+        packed.append(current)
+    return packed
+
+
 def format_result_messages(data) -> List[str]:
-    title = html.escape(getattr(data, "job_name", "") or "(not found)")
-    url = html.escape(getattr(data, "url", "") or "")
-    price = html.escape(getattr(data, "price", "") or "(not found)")
-    days = html.escape(getattr(data, "days", "") or "(not found)")
-    deadline = html.escape(getattr(data, "deadline", "") or "(not found)")
+    title = esc(getattr(data, "job_name", "") or "(not found)")
+    url = esc(getattr(data, "url", "") or "")
+    price = esc(getattr(data, "price", "") or "(not found)")
+    days = esc(getattr(data, "days", "") or "(not found)")
+    deadline = esc(getattr(data, "deadline", "") or "(not found)")
 
     desc_raw = getattr(data, "description", "") or "(not found)"
-    desc_html = html.escape(desc_raw)
+    desc_html = esc(desc_raw)
 
     tags_html = format_tags_code_lines(getattr(data, "tags", []) or [])
 
@@ -40,44 +86,39 @@ def format_result_messages(data) -> List[str]:
     if len(one) <= TG_LIMIT:
         return [one]
 
-    msgs: List[str] = []
     chunk_size = 3200
-    chunks = [desc_raw[i:i + chunk_size] for i in range(0, len(desc_raw), chunk_size)]
-
-    if chunks:
-        msgs.append(f"<b>Your proposal for the vacancy above ⬆️</b>\n<pre>{html.escape(chunks[0])}</pre>")
-        for ch in chunks[1:]:
-            msgs.append(f"<pre>{html.escape(ch)}</pre>")
-    else:
-        msgs.append(f"<b>Your proposal for the vacancy above ⬆️</b>\n<pre>(not found)</pre>")
+    chunks = _split_escaped(desc_html, chunk_size)
+    if not chunks:
+        return [f"<b>Your proposal for the vacancy above ⬆️</b>\n<pre>(not found)</pre>", meta_block]
 
-    msgs.append(meta_block)
+    msgs: List[str] = [""] * (len(chunks) + 1)
+    msgs[0] = f"<b>Your proposal for the vacancy above ⬆️</b>\n<pre>{chunks[0]}</pre>"
+    for i in range(1, len(chunks)):
+        msgs[i] = f"<pre>{chunks[i]}</pre>"
+    msgs[-1] = meta_block
     return msgs
 
 def format_ai_answer_messages(job, answer: str) -> List[str]:
-    title = html.escape(getattr(job, "job_name", "") or "(not found)")
-    url = html.escape(getattr(job, "url", "") or "")
+    title = esc(getattr(job, "job_name", "") or "(not found)")
+    url = esc(getattr(job, "url", "") or "")
     ans_raw = (answer or "").strip() or "(empty)"
 
-    one = f"<b>Your proposal for the vacancy above ⬆️</b>\n\n<pre>{html.escape(ans_raw)}</pre>\n\n{url}"
+    ans_html = esc(ans_raw)
+
+    one = f"<b>Your proposal for the vacancy above ⬆️</b>\n\n<pre>{ans_html}</pre>\n\n{url}"
     if len(one) <= TG_LIMIT:
         return [one]
 
-    msgs: List[str] = []
     chunk_size = 3200
-    chunks = [ans_raw[i: i + chunk_size] for i in range(0, len(ans_raw), chunk_size)]
+    chunks = _split_escaped(ans_html, chunk_size)
 
     if not chunks:
         return [f"<b>Your proposal for the vacancy above ⬆️</b>\n\n<pre>(empty)</pre>\n\n{url}"]
 
-    msgs.append(f"<b>{title}</b>\n\n<pre>{html.escape(chunks[0])}</pre>")
-
-    for ch in chunks[1:-1]:
-        msgs.append(f"<pre>{html.escape(ch)}</pre>")
-
-    if len(chunks) > 1:
-        msgs.append(f"<pre>{html.escape(chunks[-1])}</pre>\n\n{url}")
-    else:
-        msgs[0] = msgs[0] + f"\n\n{url}"
+    msgs: List[str] = [""] * len(chunks)
+    msgs[0] = f"<b>{title}</b>\n\n<pre>{chunks[0]}</pre>"
+    for i in range(1, len(chunks)):
+        msgs[i] = f"<pre>{chunks[i]}</pre>"
+    msgs[-1] += f"\n\n{url}"
 
     return msgs
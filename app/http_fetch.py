@@ -0,0 +1,180 @@
+import asyncio
+import re
+
+import aiohttp
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    HTMLParser = None
+
+_LABORX_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/123.0 Safari/537.36"
+    )
+}
+
+
+def create_laborx_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=32,
+        limit_per_host=8,
+        keepalive_timeout=75,
+        ttl_dns_cache=300,
+        enable_cleanup_closed=True,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=10, sock_connect=3, sock_read=7),
+        headers=_LABORX_HEADERS,
+    )
+
+
+def _text(node) -> str:
+    return node.text() if node is not None else ""
+
+
+# Раскладка блоков как у innerText: p отделяется пустой строкой, остальные блоки — переводом строки
+_BLOCK_TAGS = frozenset({
+    "address", "article", "aside", "blockquote", "dd", "div", "dl", "dt", "figcaption", "figure",
+    "footer", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol",
+    "section", "ul",
+})
+_SKIP_TAGS = frozenset({"script", "style", "template", "noscript"})
+# Здесь innerText сохраняет пробелы или вставляет табуляцию — такие описания отдаём браузеру
+_UNSUPPORTED_TAGS = frozenset({"pre", "textarea", "table"})
+_SPACE_RE = re.compile(r"[ \t\n\r\f]+")
+
+
+class _UnsupportedMarkup(Exception):
+    pass
+
+
+def _walk_text(node, out: list) -> None:
+    for child in node.iter(include_text=True):
+        tag = child.tag
+        if tag == "-text":
+            out.append(_SPACE_RE.sub(" ", child.text_content or ""))
+        elif tag == "br":
+            out.append("\n")
+        elif tag in _UNSUPPORTED_TAGS:
+            raise _UnsupportedMarkup(tag)
+        elif tag in _SKIP_TAGS or tag.startswith("-"):
+            continue
+        else:
+            breaks = 2 if tag == "p" else 1 if tag in _BLOCK_TAGS else 0
+            if breaks:
+                out.append(breaks)
+            _walk_text(child, out)
+            if breaks:
+                out.append(breaks)
+
+
+def _block_text(node) -> str:
+    items: list = []
+    _walk_text(node, items)
+
+    # Подряд идущие границы блоков сливаются в одну, по краям текста отбрасываются
+    parts: list[str] = []
+    pending = 0
+    for item in items:
+        if isinstance(item, int):
+            pending = max(pending, item)
+            continue
+        if pending:
+            item = item.lstrip(" ")
+            if not item:
+                continue
+            if parts:
+                parts[-1] = parts[-1].rstrip(" ")
+                parts.append("\n" * pending)
+            pending = 0
+        parts.append(item)
+    return "".join(parts)
+
+
+def _extract(tree, sel: dict[str, str]) -> dict | None:
+    cw = tree.css_first(sel["contentWrapper"])
+    if cw is None:
+        return None
+    pc = cw.css_first(sel["pageContent"]) or cw
+
+    desc = pc.css_first(sel["description"])
+    if desc is None:
+        return None
+
+    job_name = _text(pc.css_first(sel["jobNameFull"]))
+    if not job_name.strip():
+        job_name = _text(tree.css_first(sel["jobName"]))
+
+    price = ""
+    day_text = ""
+    deadline = ""
+    sticky = cw.css_first(sel["stickyBlock"])
+    actions = sticky.css_first(sel["actionsCard"]) if sticky is not None else None
+    job_info = actions.css_first(sel["jobInfoBlock"]) if actions is not None else None
+    if job_info is not None:
+        price = _text(job_info.css_first(sel["price"]))
+        day_value = job_info.css_first(sel["days"])
+        if day_value is not None:
+            deadline = _text(day_value.css_first(sel["grayInfo"]))
+            day_text = day_value.text()
+
+    return {
+        "jobName": job_name,
+        "description": _block_text(desc),
+        "tags": [n.text() for n in pc.css(sel["tags"])],
+        "price": price,
+        "dayText": day_text,
+        "grayText": deadline,
+        "deadline": deadline,
+    }
+
+
+# Столько страниц подряд без нужной разметки — значит, LaborX рендерит вакансии на клиенте
+_MAX_MISSES = 3
+
+
+# Быстрый путь без браузера: работает, только если LaborX отдаёт вакансию отрендеренной на сервере
+class HttpJobFetcher:
+    def __init__(self, selectors: dict[str, str]):
+        self.enabled = HTMLParser is not None
+        self._selectors = selectors
+        self._misses = 0
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            # Те же заголовки и настройки, что у проверок страниц в боте: для сайта это один клиент
+            self._session = create_laborx_session()
+        return self._session
+
+    async def fetch_raw(self, url: str) -> dict | None:
+        if not self.enabled:
+            return None
+        try:
+            async with self._get_session().get(url, allow_redirects=True) as resp:
+                if resp.status != 200 or "html" not in resp.content_type:
+                    return None
+                body = await resp.text(errors="ignore")
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None
+
+        try:
+            raw = _extract(HTMLParser(body), self._selectors)
+        except _UnsupportedMarkup:
+            # Разметку описания не повторить без браузера — эту вакансию откроет Playwright
+            return None
+        if raw is None:
+            # Одна удалённая вакансия (200 с шаблоном 404) не должна выключать быстрый путь на всю сессию
+            self._misses += 1
+            if self._misses >= _MAX_MISSES:
+                self.enabled = False
+            return None
+        self._misses = 0
+        return raw
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
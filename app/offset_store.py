@@ -0,0 +1,42 @@
+import asyncio
+import os
+from typing import Optional
+
+
+def load_offset(path: str, bot_id: int) -> Optional[int]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            stored_bot, _, offset = f.read().strip().partition(":")
+            # Файл от другого бота (сменили TG_BOT_TOKEN) игнорируем, иначе подтвердим чужие апдейты
+            if int(stored_bot) != bot_id:
+                return None
+            return int(offset)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_offset(path: str, bot_id: int, offset: int) -> None:
+    # Через временный файл и rename — при падении не остаётся обрезанного числа
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(f"{bot_id}:{offset}")
+    os.replace(tmp, path)
+
+
+class OffsetStore:
+    def __init__(self, path: str, bot_id: int):
+        self.path = path
+        self.bot_id = bot_id
+        self.offset = load_offset(path, bot_id)
+        self._lock = asyncio.Lock()
+
+    async def ack(self, update_id: int) -> None:
+        offset = update_id + 1
+        if self.offset is not None and offset <= self.offset:
+            return
+        self.offset = offset
+        async with self._lock:
+            # Пока ждали, могли подтвердить апдейт новее
+            if self.offset != offset:
+                return
+            await asyncio.to_thread(_write_offset, self.path, self.bot_id, offset)
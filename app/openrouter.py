@@ -1,10 +1,17 @@
 import asyncio
+import functools
+import json
 import os
-from typing import Any, Dict, Tuple
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 
 import aiohttp
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .cache import AsyncTTLCache
 from .config import Config
 from .state import RuntimeState
 
@@ -16,42 +23,102 @@ class OpenRouterError(RuntimeError):
     pass
 
 
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+_session: aiohttp.ClientSession | None = None
+
+
+async def _get_session() -> aiohttp.ClientSession:
+    global _session
+    # Одна сессия на процесс: keep-alive к openrouter.ai переживает ретраи и отдельные вызовы
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=8, ttl_dns_cache=300, keepalive_timeout=60)
+        _session = aiohttp.ClientSession(connector=connector)
+    return _session
+
 
+async def openrouter_close() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
 
-async def openrouter_get_key(cfg, *, timeout_seconds: int = 10) -> Dict[str, Any]:
+
+async def openrouter_get_key(
+        cfg,
+        *,
+        timeout_seconds: int = 10,
+) -> Dict[str, Any]:
     url = f"{OPENROUTER_BASE_URL}/key"
     headers = {"Authorization": f"Bearer {cfg.openrouter_api_key}"}
     timeout = aiohttp.ClientTimeout(total=timeout_seconds)
 
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        async with session.get(url, headers=headers) as resp:
-            data = await resp.json()
-            if resp.status != 200:
-                raise RuntimeError(f"/key failed HTTP {resp.status}: {str(data)[:300]}")
-            return data
+    s = await _get_session()
+    async with s.get(url, headers=headers, timeout=timeout) as resp:
+        data = _loads(await resp.read())
+        if resp.status != 200:
+            raise RuntimeError(f"/key failed HTTP {resp.status}: {str(data)[:300]}")
+        return data
 
 
-async def openrouter_get_credits(cfg, *, timeout_seconds: int = 10) -> Tuple[float, float]:
+async def openrouter_get_credits(
+        cfg,
+        *,
+        timeout_seconds: int = 10,
+) -> Tuple[float, float]:
     url = f"{OPENROUTER_BASE_URL}/credits"
     headers = {"Authorization": f"Bearer {cfg.openrouter_api_key}"}
     timeout = aiohttp.ClientTimeout(total=timeout_seconds)
 
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        async with session.get(url, headers=headers) as resp:
-            payload = await resp.json()
-            if resp.status != 200:
-                raise RuntimeError(f"/credits failed HTTP {resp.status}: {str(payload)[:300]}")
+    s = await _get_session()
+    async with s.get(url, headers=headers, timeout=timeout) as resp:
+        payload = _loads(await resp.read())
+        if resp.status != 200:
+            raise RuntimeError(f"/credits failed HTTP {resp.status}: {str(payload)[:300]}")
+
+        d = payload.get("data") or {}
+        return float(d.get("total_credits", 0.0)), float(d.get("total_usage", 0.0))
+
 
-            d = payload.get("data") or {}
-            return float(d.get("total_credits", 0.0)), float(d.get("total_usage", 0.0))
+# Баланс меняется только при пополнении: отдаём кэш, а устаревшее значение освежаем в фоне
+_credits_cache = AsyncTTLCache(300, stale_while_revalidate=True)
+
+
+async def openrouter_get_credits_cached(cfg) -> Tuple[float, float]:
+    return await _credits_cache.get(lambda: openrouter_get_credits(cfg))
 
 
 async def openrouter_get_free_daily_limit(cfg) -> int:
-    total_credits, _ = await openrouter_get_credits(cfg)
+    total_credits, _ = await openrouter_get_credits_cached(cfg)
     return 1000 if total_credits >= 10.0 else 50
 
 
+@functools.lru_cache(maxsize=4)
+def _generate_headers(api_key: str) -> Dict[str, str]:
+    # Окружение читаем при первом вызове, а не при импорте: load_dotenv() выполняется позже
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+    site_url = os.environ.get("OPENROUTER_SITE_URL")
+    app_title = os.environ.get("OPENROUTER_APP_TITLE")
+    if site_url:
+        headers["HTTP-Referer"] = site_url
+    if app_title:
+        headers["X-Title"] = app_title
+    return headers
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def _loads(raw: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
 def _to_int(v: Optional[str]) -> Optional[int]:
     if not v:
         return None
@@ -76,17 +143,7 @@ async def openrouter_generate(
     if not cfg.openrouter_model:
         raise OpenRouterError("OPENROUTER_MODEL is missing.")
 
-    headers = {
-        "Authorization": f"Bearer {cfg.openrouter_api_key}",
-        "Content-Type": "application/json",
-    }
-
-    site_url = os.environ.get("OPENROUTER_SITE_URL")
-    app_title = os.environ.get("OPENROUTER_APP_TITLE")
-    if site_url:
-        headers["HTTP-Referer"] = site_url
-    if app_title:
-        headers["X-Title"] = app_title
+    headers = _generate_headers(cfg.openrouter_api_key)
 
     body = {
         "model": cfg.openrouter_model,
@@ -99,23 +156,28 @@ async def openrouter_generate(
     if reasoning_enabled:
         body["reasoning"] = {"enabled": True}
 
+    # Тело одинаково для всех попыток — сериализуем один раз
+    payload = _dumps(body)
     timeout = aiohttp.ClientTimeout(total=timeout_seconds)
 
     last_err: Optional[str] = None
     for attempt in range(max_retries + 1):
         try:
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(CHAT_COMPLETIONS_URL, headers=headers, json=body) as resp:
-                    if state is not None:
-                        state.or_limit = _to_int(resp.headers.get("X-RateLimit-Limit"))
-                        state.or_remaining = _to_int(resp.headers.get("X-RateLimit-Remaining"))
-                        state.or_reset_ms = _to_int(resp.headers.get("X-RateLimit-Reset"))
-
-                    if resp.status != 200:
-                        txt = await resp.text()
-                        raise OpenRouterError(f"HTTP {resp.status}: {txt[:400]}")
-
-                    data = await resp.json()
+            s = await _get_session()
+            async with s.post(CHAT_COMPLETIONS_URL, headers=headers, data=payload, timeout=timeout) as resp:
+                if state is not None:
+                    state.or_limit = _to_int(resp.headers.get("X-RateLimit-Limit"))
+                    state.or_remaining = _to_int(resp.headers.get("X-RateLimit-Remaining"))
+                    state.or_reset_ms = _to_int(resp.headers.get("X-RateLimit-Reset"))
+
+                if resp.status != 200:
+                    txt = await resp.text()
+                    raise OpenRouterError(f"HTTP {resp.status}: {txt[:400]}")
+
+                try:
+                    data = _loads(await resp.read())
+                except ValueError:
+                    raise OpenRouterError("Response is not valid JSON.")
 
             try:
                 content = data["choices"][0]["message"]["content"]
@@ -1,13 +1,15 @@
 import asyncio
 import re
-import shutil
-from collections import deque
+from collections import OrderedDict
 from dataclasses import dataclass
-from pathlib import Path
 from typing import List
-from urllib.parse import urljoin
+from urllib.parse import urlsplit
 
-from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+from .browser_pool import get_browser
+from .http_fetch import HttpJobFetcher
+from .ratelimit import RateLimiter
 
 SEL_FIRST_CARD = ".root.job-card.child-card"
 SEL_CARD_LINK = ".job-title.job-link.row"
@@ -28,22 +30,24 @@ SEL_JOB_INFO_BLOCK = ".job-info-block"
 SEL_PRICE = ".info-item.budget-info .info-value"
 SEL_DAYS = ".info-item.day-info .info-value"
 
-_JOB_ID_RE = re.compile(r"-(\d+)$")
+_WS_RE = re.compile(r"\s+")
+_INLINE_WS_RE = re.compile(r"[^\S\n]+")
+_LINE_EDGE_RE = re.compile(r" ?\n ?")
+# \r превращаем в пробел: у \r\n его потом снимает _LINE_EDGE_RE, одиночный \r и так схлопывался в пробел
+_NORMALIZE_TT = str.maketrans({"\u00a0": " ", "\r": " "})
 
 LABORX_BASE = "https://laborx.com"
 
-
-def reset_user_data_dir(user_data_dir: str) -> str:
-    p = Path(user_data_dir).resolve()
-    if p.exists():
-        shutil.rmtree(p, ignore_errors=True)
-    p.mkdir(parents=True, exist_ok=True)
-    return str(p)
+_BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media", "stylesheet"})
+_NORMALIZE_INLINE_LIMIT = 4096
 
 
 def extract_job_id(href: str) -> int | None:
-    m = _JOB_ID_RE.search(href or "")
-    return int(m.group(1)) if m else None
+    if not href:
+        return None
+    # Хвост после последнего дефиса; isascii() отсекает «цифры» вроде ², на которых int() падает
+    tail = href.rpartition("-")[2]
+    return int(tail) if tail.isascii() and tail.isdigit() else None
 
 
 @dataclass
@@ -59,109 +63,172 @@ class JobData:
 
 async def get_job_hrefs_from_list(page, limit: int) -> list[str]:
     await page.wait_for_selector(SEL_FIRST_CARD, timeout=30_000)
-    cards = page.locator(SEL_FIRST_CARD)
-    n = min(await cards.count(), limit)
+    return await page.eval_on_selector_all(
+        SEL_FIRST_CARD,
+        """(els, [lim, linkSel]) => els.slice(0, lim)
+            .map((e) => e.querySelector(linkSel)?.getAttribute("href"))
+            .filter(Boolean)""",
+        [limit, SEL_CARD_LINK],
+    )
 
-    hrefs: list[str] = []
-    for i in range(n):
-        link = cards.nth(i).locator(SEL_CARD_LINK).first
-        href = await link.get_attribute("href")
-        if href:
-            hrefs.append(href)
-    return hrefs
 
+SEL_DESCRIPTION = f"{SEL_JOB_DESCRIPTION_ROOT} {SEL_JOB_INFO_SECTION} .description"
+SEL_JOB_NAME_FULL = f"{SEL_GENERAL_INFO_CARD} {SEL_JOB_NAME}"
+SEL_ACTIONS_CARD = ".root.actions-card.actions-card"
+SEL_GRAY_INFO = ".gray-info"
+
+# Вся выборка со страницы вакансии за один вызов evaluate вместо десятка запросов к браузеру
+_EXTRACT_JS = """(sel) => {
+    const text = (root, selector) => {
+        const el = root ? root.querySelector(selector) : null;
+        return el ? el.innerText : "";
+    };
+
+    const cw = document.querySelector(sel.contentWrapper);
+    const pc = (cw && cw.querySelector(sel.pageContent)) || cw;
+
+    let jobName = text(pc, sel.jobNameFull);
+    if (!jobName.trim()) {
+        jobName = text(document, sel.jobName);
+    }
+
+    const descEl = pc ? pc.querySelector(sel.description) : null;
+    const tags = pc ? Array.from(pc.querySelectorAll(sel.tags), (el) => el.innerText) : [];
+
+    let price = "";
+    let dayText = "";
+    let grayText = "";
+    let deadline = "";
+    const sticky = cw ? cw.querySelector(sel.stickyBlock) : null;
+    const actions = sticky ? sticky.querySelector(sel.actionsCard) : null;
+    const jobInfo = actions ? actions.querySelector(sel.jobInfoBlock) : null;
+    if (jobInfo) {
+        price = text(jobInfo, sel.price);
+        const dayValue = jobInfo.querySelector(sel.days);
+        if (dayValue) {
+            const span = dayValue.querySelector(sel.grayInfo);
+            deadline = span ? span.innerText : "";
+            grayText = span ? span.textContent : "";
+            dayText = dayValue.textContent;
+        }
+    }
+
+    return {
+        jobName,
+        description: descEl ? descEl.innerText : null,
+        tags,
+        price,
+        dayText,
+        grayText,
+        deadline,
+    };
+}"""
+
+_EXTRACT_SELECTORS = {
+    "contentWrapper": SEL_CONTENT_WRAPPER,
+    "pageContent": SEL_PAGE_CONTENT,
+    "jobNameFull": SEL_JOB_NAME_FULL,
+    "jobName": SEL_JOB_NAME,
+    "description": SEL_DESCRIPTION,
+    "tags": SEL_TAGS,
+    "stickyBlock": SEL_STICKY_BLOCK,
+    "actionsCard": SEL_ACTIONS_CARD,
+    "jobInfoBlock": SEL_JOB_INFO_BLOCK,
+    "grayInfo": SEL_GRAY_INFO,
+    "price": SEL_PRICE,
+    "days": SEL_DAYS,
+}
+
+
+def _collapse_ws(txt: str) -> str:
+    return _WS_RE.sub(" ", txt or "").strip()
+
+
+def _normalize(raw: dict, url: str) -> JobData:
+    # Пробелы внутри строк схлопываем, переводы строк описания сохраняем
+    desc = raw["description"].translate(_NORMALIZE_TT)
+    description = _LINE_EDGE_RE.sub("\n", _INLINE_WS_RE.sub(" ", desc)).strip()
 
-async def safe_text(locator, default: str = "") -> str:
-    try:
-        txt = await locator.first.inner_text()
-        return " ".join(txt.split())
-    except Exception:
-        return default
+    tags: list[str] = []
+    for t in raw["tags"]:
+        t = (t or "").translate(_NORMALIZE_TT).strip()
+        if t:
+            tags.append(t)
+
+    return JobData(
+        job_name=_collapse_ws(raw["jobName"]),
+        description=description,
+        tags=tags,
+        price=_collapse_ws(raw["price"]),
+        days=(raw["dayText"] or "").replace(raw["grayText"] or "", "", 1).strip(),
+        deadline=_collapse_ws(raw["deadline"]),
+        url=url,
+    )
+
+
+async def _normalize_async(raw: dict, url: str) -> JobData:
+    # Длинные описания чистим в потоке, чтобы не держать цикл событий; короткие дешевле на месте
+    if len(raw["description"]) > _NORMALIZE_INLINE_LIMIT:
+        return await asyncio.to_thread(_normalize, raw, url)
+    return _normalize(raw, url)
 
 
 async def parse_job_page(page) -> JobData:
-    try:
-        await page.wait_for_selector(SEL_CONTENT_WRAPPER, timeout=15_000, state="attached")
-    except PlaywrightTimeoutError:
-        raise
+    # Описание обязательно: ждём его появления, остальное забираем одним evaluate
+    await page.wait_for_selector(SEL_DESCRIPTION, timeout=15_000, state="attached")
+    raw = await page.evaluate(_EXTRACT_JS, _EXTRACT_SELECTORS)
 
-    cw = page.locator(SEL_CONTENT_WRAPPER).first
+    if raw["description"] is None:
+        raise RuntimeError("Job description not found")
+    return await _normalize_async(raw, page.url)
 
-    pc_loc = cw.locator(SEL_PAGE_CONTENT)
-    pc = pc_loc.first if (await pc_loc.count() > 0) else cw
 
-    job_name = await safe_text(pc.locator(f"{SEL_GENERAL_INFO_CARD} {SEL_JOB_NAME}"), default="")
-    if not job_name:
-        job_name = await safe_text(page.locator(SEL_JOB_NAME), default="")
+async def _block_heavy_resources(route) -> None:
+    # Картинки, шрифты, медиа и стили парсеру не нужны — не тратим на них время загрузки
+    if route.request.resource_type in _BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
 
-    desc_section = pc.locator(f"{SEL_JOB_DESCRIPTION_ROOT} {SEL_JOB_INFO_SECTION} .description").first
-    raw = await desc_section.inner_text()
-    raw = raw.replace("\u00a0", " ").replace("\r\n", "\n")
-    lines = [" ".join(line.split()) for line in raw.split("\n")]
-    description = "\n".join(lines).strip()
 
-    tags: list[str] = []
+async def _fetch_job(page, job_url: str, state) -> JobData | None:
+    # Достаточно ответа сервера: готовность страницы синхронизирует ожидание описания в parse_job_page
+    resp = await page.goto(job_url, wait_until="commit")
+
+    if resp is not None and resp.status >= 400:
+        state.last_error = f"HTTP {resp.status}: {job_url}"
+        return None
+
     try:
-        tag_texts = await pc.locator(SEL_TAGS).all_inner_texts()
-        for t in tag_texts:
-            t = (t or "").replace("\u00a0", " ").strip()
-            if t:
-                tags.append(t)
-    except Exception:
-        pass
-
-    price = ""
-    days = ""
-    deadline = ""
-
-    sticky_loc = cw.locator(SEL_STICKY_BLOCK)
-    if await sticky_loc.count() > 0:
-        actions_loc = sticky_loc.first.locator(".root.actions-card.actions-card")
-        if await actions_loc.count() > 0:
-            job_info_loc = actions_loc.first.locator(SEL_JOB_INFO_BLOCK)
-            if await job_info_loc.count() > 0:
-                job_info = job_info_loc.first
-
-                price = await safe_text(job_info.locator(SEL_PRICE), default="")
-
-                day_value_loc = job_info.locator(SEL_DAYS)
-                if await day_value_loc.count() > 0:
-                    day_value = day_value_loc.first
-
-                    gray_loc = day_value.locator(".gray-info")
-                    deadline = await safe_text(gray_loc, default="")
-
-                    try:
-                        days = await day_value.evaluate(
-                            """(el) => {
-                                const span = el.querySelector('.gray-info');
-                                const spanText = span ? span.textContent : '';
-                                return el.textContent.replace(spanText, '').trim();
-                            }""",
-                            timeout=2000
-                        )
-                    except Exception:
-                        days = ""
+        return await parse_job_page(page)
+    except PlaywrightTimeoutError as e:
+        state.last_error = f"Timeout parsing job page: {job_url} | {e}"
+    except Exception as e:
+        state.last_error = f"Parse error: {job_url} | {e}"
+    return None
 
-    return JobData(
-        job_name=job_name,
-        description=description,
-        tags=tags,
-        price=price,
-        days=days,
-        deadline=deadline,
-        url=page.url,
-    )
+
+def _job_url(base: str, href: str) -> str:
+    if href.startswith(("http://", "https://")):
+        return href
+    return base + (href if href.startswith("/") else "/" + href)
+
+
+async def _wait_stop(stop_event: asyncio.Event, timeout: float) -> bool:
+    # Пауза, которую /stop прерывает сразу, а не по истечении таймаута
+    try:
+        await asyncio.wait_for(stop_event.wait(), timeout=timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
 
 
-def mark_seen(href: str, seen_hrefs: set[str], seen_order: deque, limit: int) -> None:
-    if href in seen_hrefs:
+def mark_seen(href: str, seen: OrderedDict[str, None], limit: int) -> None:
+    if href in seen:
         return
-    if len(seen_order) >= limit:
-        old = seen_order.popleft()
-        seen_hrefs.discard(old)
-    seen_order.append(href)
-    seen_hrefs.add(href)
+    if len(seen) >= limit:
+        seen.popitem(last=False)
+    seen[href] = None
 
 
 async def parser_loop(cfg, state, out_queue: asyncio.Queue["JobData"], stop_event: asyncio.Event) -> None:
@@ -170,132 +237,130 @@ async def parser_loop(cfg, state, out_queue: asyncio.Queue["JobData"], stop_even
     max_list_items = cfg.max_list_items
     seen_limit = cfg.seen_limit
     headless = cfg.headless
+    # Ссылки в списке относительные к его origin — собираем адрес без urljoin на каждую вакансию
+    root = urlsplit(list_url)
+    base = f"{root.scheme}://{root.netloc}" if root.netloc else LABORX_BASE
 
-    state.seen_set = set()
-    state.seen_order = deque()
+    state.seen = OrderedDict()
     state.sent_count = 0
     state.last_error = None
     state.max_seen_job_id = 0
     state.last_seen_href = None
 
-    user_data_dir = reset_user_data_dir(cfg.user_data_dir)
+    http_fetcher = HttpJobFetcher(_EXTRACT_SELECTORS) if cfg.http_fast_path else None
+    # Темп запросов к LaborX ограничивает скользящее окно, а не паузы между вакансиями
+    site_limiter = RateLimiter(global_burst=max(1, cfg.max_rps), global_window=1.0)
 
-    async with async_playwright() as p:
-        context = await p.chromium.launch_persistent_context(
-            user_data_dir=user_data_dir,
-            headless=headless,
-        )
+    # Браузер общий на процесс, а чистый контекст поднимается за миллисекунды
+    browser = await get_browser(headless=headless)
+    context = await browser.new_context()
+    # Всё, что создаётся в контексте, уже внутри try: при сбое контекст не утечёт в общем браузере
+    try:
+        await context.route("**/*", _block_heavy_resources)
         page = await context.new_page()
         page.set_default_timeout(20_000)
-
-        try:
-            await page.goto(list_url, wait_until="domcontentloaded")
-            await page.wait_for_selector(SEL_FIRST_CARD, timeout=30_000)
-
-            while not stop_event.is_set():
-                try:
-                    await page.evaluate("window.scrollTo(0, 0)")
-
-                    first_run = (state.max_seen_job_id == 0)
-
-                    scan_limit = (max_list_items * 5) if first_run else max_list_items
-                    hrefs = await get_job_hrefs_from_list(page, limit=scan_limit)
-
-                    if not hrefs:
-                        await asyncio.sleep(1)
+        # Вакансии открываем в отдельных вкладках, небольшим пулом параллельно
+        detail_pages: asyncio.Queue = asyncio.Queue()
+        for _ in range(max(1, cfg.parse_concurrency or 3)):
+            detail_page = await context.new_page()
+            detail_page.set_default_timeout(20_000)
+            detail_pages.put_nowait(detail_page)
+
+        await page.goto(list_url, wait_until="domcontentloaded")
+        await page.wait_for_selector(SEL_FIRST_CARD, timeout=30_000)
+
+        while not stop_event.is_set():
+            try:
+                first_run = (state.max_seen_job_id == 0)
+
+                scan_limit = (max_list_items * 5) if first_run else max_list_items
+                hrefs = await get_job_hrefs_from_list(page, limit=scan_limit)
+
+                if not hrefs:
+                    await _wait_stop(stop_event, 1)
+                else:
+                    # id считаем один раз на ссылку: и для максимума, и для фильтра новых
+                    href_ids = [extract_job_id(h) for h in hrefs]
+                    top_max_id = max((i for i in href_ids if i is not None), default=0)
+
+                    if first_run:
+                        candidates = hrefs[:]  # много ссылок
+                        targets: list[str] = []
+                        for h in candidates:
+                            if h not in state.seen:
+                                targets.append(h)
+                            if len(targets) >= max_list_items:
+                                break
+                        new_hrefs = targets
                     else:
-                        ids = [extract_job_id(h) for h in hrefs]
-                        ids = [i for i in ids if i is not None]
-                        top_max_id = max(ids) if ids else 0
-
-                        if first_run:
-                            candidates = hrefs[:]  # много ссылок
-                            targets: list[str] = []
-                            for h in candidates:
-                                if h not in state.seen_set:
-                                    targets.append(h)
-                                if len(targets) >= max_list_items:
-                                    break
-                            new_hrefs = targets
-                        else:
-                            if state.last_seen_href and state.last_seen_href in hrefs:
-                                idx = hrefs.index(state.last_seen_href)
-                                candidates = hrefs[:idx]
+                        stop_idx = len(hrefs)
+                        if state.last_seen_href:
+                            try:
+                                stop_idx = hrefs.index(state.last_seen_href)
+                            except ValueError:
+                                pass
+
+                        new_hrefs = [
+                            h for h, jid in zip(hrefs[:stop_idx], href_ids[:stop_idx])
+                            if jid is not None and jid > state.max_seen_job_id and h not in state.seen
+                        ]
+
+                    if new_hrefs:
+                        async def fetch_one(href: str) -> JobData | None:
+                            if stop_event.is_set():
+                                return None
+                            job_url = _job_url(base, href)
+                            await site_limiter.acquire()
+                            raw = await http_fetcher.fetch_raw(job_url) if http_fetcher else None
+                            if raw is not None:
+                                data = await _normalize_async(raw, job_url)
                             else:
-                                candidates = hrefs[:]
-
-                            new_hrefs = []
-                            for h in candidates:
-                                jid = extract_job_id(h)
-                                if jid is not None and jid > state.max_seen_job_id and h not in state.seen_set:
-                                    new_hrefs.append(h)
-
-                        if new_hrefs:
-                            for href in reversed(new_hrefs):
-                                if stop_event.is_set():
-                                    break
-
-                                job_url = urljoin(LABORX_BASE, href)
-
-                                data = None
+                                detail_page = await detail_pages.get()
                                 try:
-                                    resp = await page.goto(job_url, wait_until="domcontentloaded")
-
-                                    if resp is not None and resp.status >= 400:
-                                        state.last_error = f"HTTP {resp.status}: {job_url}"
-                                        mark_seen(href, state.seen_set, state.seen_order, seen_limit)
-                                        continue
-
-                                    try:
-                                        await page.wait_for_selector(SEL_CONTENT_WRAPPER, timeout=15_000,
-                                                                     state="attached")
-                                    except PlaywrightTimeoutError:
-                                        state.last_error = f"No content wrapper: {job_url}"
-                                        mark_seen(href, state.seen_set, state.seen_order, seen_limit)
-                                        continue
-
-                                    try:
-                                        data = await parse_job_page(page)
-                                    except PlaywrightTimeoutError as e:
-                                        state.last_error = f"Timeout parsing job page: {job_url} | {e}"
-                                    except Exception as e:
-                                        state.last_error = f"Parse error: {job_url} | {e}"
-
+                                    data = await _fetch_job(detail_page, job_url, state)
                                 finally:
-                                    await page.goto(list_url, wait_until="domcontentloaded")
-                                    await page.wait_for_selector(SEL_FIRST_CARD, timeout=30_000)
-
-                                if data is None:
-                                    mark_seen(href, state.seen_set, state.seen_order, seen_limit)
-                                    await asyncio.sleep(0.3)
-                                    continue
+                                    detail_pages.put_nowait(detail_page)
+                            mark_seen(href, state.seen, seen_limit)
+                            return data
+
+                        # Порядок результатов совпадает с порядком ссылок: старые вакансии уходят первыми
+                        results = await asyncio.gather(
+                            *(fetch_one(h) for h in reversed(new_hrefs)),
+                            return_exceptions=True,
+                        )
 
+                        failure: BaseException | None = None
+                        for data in results:
+                            if isinstance(data, BaseException):
+                                failure = failure or data
+                            elif data is not None:
                                 await out_queue.put(data)
                                 state.sent_count += 1
-                                mark_seen(href, state.seen_set, state.seen_order, seen_limit)
-                                await asyncio.sleep(0.6)
 
-                        state.max_seen_job_id = max(state.max_seen_job_id, top_max_id)
-                        state.last_seen_href = hrefs[0]
+                        # Упавшие на навигации ссылки не помечены — повторим их в следующем цикле
+                        if failure is not None:
+                            raise failure
 
-                    try:
-                        await asyncio.wait_for(stop_event.wait(), timeout=interval_seconds)
-                    except asyncio.TimeoutError:
-                        pass
+                    state.max_seen_job_id = max(state.max_seen_job_id, top_max_id)
+                    state.last_seen_href = hrefs[0]
 
-                    if not stop_event.is_set():
-                        await page.reload(wait_until="domcontentloaded")
-                        await page.wait_for_selector(SEL_FIRST_CARD, timeout=30_000)
+                await _wait_stop(stop_event, interval_seconds)
 
-                except PlaywrightTimeoutError as e:
-                    state.last_error = f"Timeout: {e}"
-                    await page.goto(list_url, wait_until="domcontentloaded")
+                if not stop_event.is_set():
+                    await page.reload(wait_until="domcontentloaded")
                     await page.wait_for_selector(SEL_FIRST_CARD, timeout=30_000)
-                    await asyncio.sleep(2)
 
-                except Exception as e:
-                    state.last_error = str(e)
-                    await asyncio.sleep(2)
+            except PlaywrightTimeoutError as e:
+                state.last_error = f"Timeout: {e}"
+                await page.goto(list_url, wait_until="domcontentloaded")
+                await page.wait_for_selector(SEL_FIRST_CARD, timeout=30_000)
+                await _wait_stop(stop_event, 2)
+
+            except Exception as e:
+                state.last_error = str(e)
+                await _wait_stop(stop_event, 2)
 
-        finally:
-            await context.close()
+    finally:
+        if http_fetcher is not None:
+            await http_fetcher.close()
+        await context.close()
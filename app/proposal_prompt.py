@@ -1,3 +1,6 @@
+import re
+import string
+
 from .parser import JobData
 
 PROMPT_TEMPLATE = """You are a senior backend-focused full-stack engineer with nearly 4 years of production experience in:
@@ -99,6 +102,12 @@ Now write the reply.
 """
 
 
+_PLACEHOLDER_RE = re.compile(r"\{\{(TITLE|URL|PRICE|DAYS|DEADLINE|DESCRIPTION|PORTFOLIO_URL)\}\}")
+
+# Шаблон разбирается один раз при импорте; конструкции вроде {{DEADLINE or 'after kickoff'}} остаются текстом
+_PROMPT_TPL = string.Template(_PLACEHOLDER_RE.sub(r"${\1}", PROMPT_TEMPLATE.replace("$", "$$")))
+
+
 def _val(v: str, default: str = "(not found)") -> str:
     v = (v or "").strip()
     return v if v else default
@@ -112,12 +121,12 @@ def build_filled_prompt(job: JobData, portfolio_url: str) -> str:
     deadline = _val(job.deadline)
     desc = _val(job.description)
 
-    prompt = PROMPT_TEMPLATE
-    prompt = prompt.replace("{{TITLE}}", title)
-    prompt = prompt.replace("{{URL}}", url)
-    prompt = prompt.replace("{{PRICE}}", price)
-    prompt = prompt.replace("{{DAYS}}", days)
-    prompt = prompt.replace("{{DEADLINE}}", deadline)
-    prompt = prompt.replace("{{DESCRIPTION}}", desc)
-    prompt = prompt.replace("{{PORTFOLIO_URL}}", portfolio_url)
-    return prompt
+    return _PROMPT_TPL.substitute(
+        TITLE=title,
+        URL=url,
+        PRICE=price,
+        DAYS=days,
+        DEADLINE=deadline,
+        DESCRIPTION=desc,
+        PORTFOLIO_URL=portfolio_url,
+    )
@@ -0,0 +1,55 @@
+import asyncio
+import time
+from collections import deque
+
+
+class RateLimiter:
+    def __init__(
+            self,
+            *,
+            global_burst: int = 30,
+            global_window: float = 1.0,
+            chat_burst: int = 20,
+            chat_window: float = 60.0,
+            chat_interval: float = 1.0,
+    ):
+        self.global_burst = global_burst
+        self.global_window = global_window
+        self.chat_burst = chat_burst
+        self.chat_window = chat_window
+        self.chat_interval = chat_interval
+
+        self._global: deque[float] = deque()
+        self._per_chat: dict[int, deque[float]] = {}
+        self._last_chat: dict[int, float] = {}
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _wait_time(window: deque[float], burst: int, window_len: float, now: float) -> float:
+        while window and now - window[0] >= window_len:
+            window.popleft()
+        if len(window) < burst:
+            return 0.0
+        return window[0] + window_len - now
+
+    async def acquire(self, chat_id: int | None = None, *, group: bool = False) -> None:
+        while True:
+            # Лок держим только на время расчёта: ожидание одного чата не задерживает остальные
+            async with self._lock:
+                now = time.monotonic()
+                delay = self._wait_time(self._global, self.global_burst, self.global_window, now)
+                chat_window = None
+                if chat_id is not None:
+                    # Окно 20/мин — лимит Telegram для групп, в личке достаточно интервала
+                    if group:
+                        chat_window = self._per_chat.setdefault(chat_id, deque())
+                        delay = max(delay, self._wait_time(chat_window, self.chat_burst, self.chat_window, now))
+                    delay = max(delay, self._last_chat.get(chat_id, 0.0) + self.chat_interval - now)
+                if delay <= 0:
+                    self._global.append(now)
+                    if chat_window is not None:
+                        chat_window.append(now)
+                    if chat_id is not None:
+                        self._last_chat[chat_id] = now
+                    return
+            await asyncio.sleep(delay)
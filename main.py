@@ -3,16 +3,31 @@ from dotenv import load_dotenv
 
 from app.config import load_config
 from app.bot import setup_bot
+from app.offset_store import OffsetStore
 
 try:
     from aiogram.utils.backoff import BackoffConfig
 except Exception:
     BackoffConfig = None
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
-async def main():
-    load_dotenv()
-    cfg = load_config()
+# Тяжёлые типы апдейтов, которые бот не обрабатывает
+_DENIED_UPDATES = {
+    "chat_member",
+    "message_reaction",
+    "message_reaction_count",
+    "business_connection",
+    "business_message",
+}
+
+
+async def main(cfg):
+    # PYTHONASYNCIODEBUG из dev-окружения не должен замедлять прод
+    asyncio.get_running_loop().set_debug(False)
 
     bot = None
     dp = None
@@ -20,28 +35,53 @@ async def main():
 
     try:
         bot, dp, app = setup_bot(cfg)
+        offsets = OffsetStore(cfg.offset_path, bot.id)
 
+        @dp.update.outer_middleware()
+        async def ack_update(handler, event, data):
+            result = await handler(event, data)
+            await offsets.ack(event.update_id)
+            return result
+
+        used_updates = set(dp.resolve_used_update_types()) - _DENIED_UPDATES
         start_polling_kwargs = {
-            "polling_timeout": 30,
-            "allowed_updates": dp.resolve_used_update_types(),
+            "polling_timeout": 50,
+            # Каждый апдейт — отдельная задача: медленный хендлер не держит getUpdates
+            "handle_as_tasks": True,
+            "allowed_updates": tuple(sorted(used_updates)),
         }
 
         if BackoffConfig is not None:
             start_polling_kwargs["backoff_config"] = BackoffConfig(
-                min_delay=5.0,
-                max_delay=60.0,
+                min_delay=1.0,
+                max_delay=30.0,
                 factor=2.0,
-                jitter=0.1,
+                jitter=0.5,
             )
 
+        # bot.me() кэширует профиль, его же потом спросит start_polling
+        await asyncio.gather(bot.me(), bot.delete_webhook(drop_pending_updates=False))
+        if offsets.offset is not None:
+            # Подтверждаем Telegram уже обработанные апдейты, чтобы они не пришли повторно
+            await bot.get_updates(offset=offsets.offset, limit=1, timeout=0)
+
         await dp.start_polling(bot, **start_polling_kwargs)
 
     finally:
+        closers = []
         if bot is not None:
-            await bot.session.close()
-        if app is not None and getattr(app, "http", None) is not None and not app.http.closed:
-            await app.http.close()
+            closers.append(bot.session.close())
+        if app is not None and not app.http.closed:
+            closers.append(app.http.close())
+        # Сессии закрываем параллельно, ошибка одной не мешает другой
+        await asyncio.gather(*closers, return_exceptions=True)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # Конфиг читаем до запуска цикла событий
+    load_dotenv()
+    config = load_config()
+    if uvloop is not None:
+        uvloop.run(main(config))
+    else:
+        asyncio.run(main(config))